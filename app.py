@@ -52,6 +52,7 @@ def main():
                     result = response_with_sources_streaming(prompt)
                     response_stream = result["response_stream"]
                     sources = result.get("sources", [])
+                    citations = result.get("citations", [])
                     
                     # Real token-by-token streaming
                     message_placeholder = st.empty()
@@ -69,7 +70,13 @@ def main():
                     if sources:
                         with st.expander("📄 Source Documents"):
                             for i, source in enumerate(sources):
-                                st.write(f"**Source {i+1}:** {source}")
+                                st.write(f"**Source {i+1}** (chunk {source['chunk_id']}): {source['text']}")
+                    
+                    # Show which source backs each answer sentence
+                    if citations:
+                        with st.expander("🔗 Citations"):
+                            for citation in citations:
+                                st.write(f"**Source {citation['source_index']+1}:** {citation['sentence']}")
                     
                 except Exception as e:
                     st.error(f"Error generating response: {str(e)}")
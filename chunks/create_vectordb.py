@@ -1,5 +1,7 @@
 import os
+import sys
 import pickle
+import argparse
 from sentence_transformers import SentenceTransformer
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -7,17 +9,34 @@ from langchain.schema import Document
 from nltk.tokenize import sent_tokenize
 import nltk
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.sharding import write_manifest
+from src.snapshots import new_snapshot_path, publish_snapshot, prune_snapshots
+
 def sentence_aware_chunking(text, chunk_size=300):
     chunks, current_chunk, word_count = [], [], 0
+    # Character offsets of the current chunk in the source text, for citations.
+    # A chunk containing a sentence that can't be located gets no offsets.
+    chunk_start, chunk_end, offsets_known, position = None, 0, True, 0
     for sentence in sent_tokenize(text):
         sentence_words = len(sentence.split())
         if word_count + sentence_words > chunk_size and current_chunk:
             chunks.append({
                 'text': ' '.join(current_chunk), 
                 'word_count': word_count, 
-                'chunk_id': len(chunks)
+                'chunk_id': len(chunks),
+                'start_offset': chunk_start if offsets_known else None,
+                'end_offset': chunk_end if offsets_known else None
             })
-            current_chunk, word_count = [], 0
+            current_chunk, word_count, chunk_start, offsets_known = [], 0, None, True
+        sentence_start = text.find(sentence, position)
+        if sentence_start == -1:
+            print(f"Warning: could not locate sentence in source text, chunk {len(chunks)} will have no offsets: {sentence[:60]!r}")
+            offsets_known = False
+        else:
+            position = chunk_end = sentence_start + len(sentence)
+            if chunk_start is None:
+                chunk_start = sentence_start
         current_chunk.append(sentence)
         word_count += sentence_words
     
@@ -25,11 +44,13 @@ def sentence_aware_chunking(text, chunk_size=300):
         chunks.append({
             'text': ' '.join(current_chunk), 
             'word_count': word_count, 
-            'chunk_id': len(chunks)
+            'chunk_id': len(chunks),
+            'start_offset': chunk_start if offsets_known else None,
+            'end_offset': chunk_end if offsets_known else None
         })
     return chunks
 
-def create_vectorstore():
+def create_vectorstore(num_shards=1, keep_snapshots=3):
     # Load and preprocess the document
     text_path = os.path.join("data", "AI Training Document.pdf")
     
@@ -57,6 +78,8 @@ def create_vectorstore():
             metadata={
                 'chunk_id': chunk['chunk_id'],
                 'word_count': chunk['word_count'],
+                'start_offset': chunk['start_offset'],
+                'end_offset': chunk['end_offset'],
                 'source': 'AI Training Document'
             }
         )
@@ -66,13 +89,26 @@ def create_vectorstore():
     print("Creating embeddings...")
     embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-large-en-v1.5")
     
+    # Build into a fresh snapshot so running servers never see a half-written index
+    snapshot_path = new_snapshot_path("vectordb")
+    
+    if num_shards > 1:
+        create_sharded_vectorstore(documents, embeddings, num_shards, snapshot_path)
+        publish_snapshot("vectordb", snapshot_path)
+        prune_snapshots("vectordb", keep=keep_snapshots)
+        return
+
     # Create FAISS vectorstore
     print("Creating FAISS vectorstore...")
     vectorstore = FAISS.from_documents(documents, embeddings)
     
     # Save the vectorstore
-    print("Saving vectorstore...")
-    vectorstore.save_local("vectordb")
+    print(f"Saving vectorstore to {snapshot_path}...")
+    vectorstore.save_local(snapshot_path)
+    
+    # Switch running servers over to the new snapshot
+    publish_snapshot("vectordb", snapshot_path)
+    prune_snapshots("vectordb", keep=keep_snapshots)
     
     print("Vectorstore created successfully!")
     
@@ -86,5 +122,25 @@ def create_vectorstore():
     for i, result in enumerate(results):
         print(f"Result {i+1}: {result.page_content[:100]}...")
 
+def create_sharded_vectorstore(documents, embeddings, num_shards, output_path):
+    # Round-robin keeps shard sizes balanced whatever the document order
+    shard_dirs = []
+    for shard_id in range(num_shards):
+        shard_documents = documents[shard_id::num_shards]
+        if not shard_documents:
+            continue
+        shard_dir = f"shard_{shard_id}"
+        print(f"Creating FAISS shard {shard_dir} with {len(shard_documents)} chunks...")
+        vectorstore = FAISS.from_documents(shard_documents, embeddings)
+        vectorstore.save_local(os.path.join(output_path, shard_dir))
+        shard_dirs.append(shard_dir)
+    
+    write_manifest(output_path, shard_dirs)
+    print(f"Sharded vectorstore created successfully with {len(shard_dirs)} shards!")
+
 if __name__ == "__main__":
-    create_vectorstore()
+    parser = argparse.ArgumentParser(description="Create the FAISS vectorstore")
+    parser.add_argument("--shards", type=int, default=1, help="Number of index shards to partition the corpus into")
+    parser.add_argument("--keep-snapshots", type=int, default=3, help="Number of index snapshots to keep on disk")
+    args = parser.parse_args()
+    create_vectorstore(num_shards=args.shards, keep_snapshots=args.keep_snapshots)
@@ -0,0 +1,117 @@
+import os
+import json
+import asyncio
+import threading
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from pydantic import BaseModel
+
+# Load environment variables
+load_dotenv()
+
+# — SERVER CONFIGURATION —
+HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Every worker process loads its own copy of the embedding model and index,
+# so keep this at 1 and scale with SERVER_MAX_CONCURRENCY where possible.
+WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+# Concurrent requests served per worker, all sharing the one loaded index.
+MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "8"))
+
+app = FastAPI(title="Legal Document AI Chatbot API")
+
+# The RAG pipeline loads the embedding model and vectorstore at import time,
+# so it is imported in the background and readiness reported separately.
+pipeline = None
+pipeline_error = None
+pipeline_loaded = threading.Event()
+request_slots = None
+
+
+class QueryRequest(BaseModel):
+    question: str
+
+
+def load_pipeline():
+    global pipeline, pipeline_error
+    try:
+        from src import retrival
+        pipeline = retrival
+    except Exception as e:
+        pipeline_error = str(e)
+        print(f"Error loading RAG pipeline: {e}")
+    finally:
+        pipeline_loaded.set()
+
+
+@app.on_event("startup")
+async def startup():
+    global request_slots
+    request_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    threading.Thread(target=load_pipeline, daemon=True).start()
+
+
+def require_pipeline():
+    if pipeline is None:
+        detail = pipeline_error or "Index is still loading"
+        raise HTTPException(status_code=503, detail=detail)
+    return pipeline
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: the embedding model and index are loaded."""
+    if pipeline is not None:
+        return {"status": "ready"}
+    if pipeline_loaded.is_set():
+        return JSONResponse(status_code=503, content={"status": "error", "detail": pipeline_error})
+    return JSONResponse(status_code=503, content={"status": "loading"})
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    """Answer a question and return the full answer with its sources and citations."""
+    rag = require_pipeline()
+    async with request_slots:
+        return await run_in_threadpool(rag.response_with_sources, request.question)
+
+
+@app.post("/stream")
+async def stream(request: QueryRequest):
+    """Stream the answer as server-sent events, sending sources first."""
+    rag = require_pipeline()
+
+    async def event_stream():
+        async with request_slots:
+            result = await run_in_threadpool(rag.response_with_sources_streaming, request.question)
+            citations = result.get("citations", [])
+            sent = 0
+            yield sse_event("sources", result.get("sources", []))
+            async for token in iterate_in_threadpool(result["response_stream"]):
+                yield sse_event("token", token)
+                # Citations are appended as answer sentences complete
+                while sent < len(citations):
+                    yield sse_event("citation", citations[sent])
+                    sent += 1
+            for citation in citations[sent:]:
+                yield sse_event("citation", citation)
+            yield sse_event("done", {})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("server:app", host=HOST, port=PORT, workers=WORKERS)
@@ -0,0 +1,114 @@
+import re
+from typing import List
+from langchain_core.documents import Document
+
+WORD_PATTERN = re.compile(r"\w+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def source_from_doc(doc: Document) -> dict:
+    """Describe a retrieved chunk with its id and character offsets in the source document."""
+    return {
+        "chunk_id": doc.metadata.get("chunk_id"),
+        "source": doc.metadata.get("source"),
+        "start_offset": doc.metadata.get("start_offset"),
+        "end_offset": doc.metadata.get("end_offset"),
+        "text": doc.page_content[:200] + "..."
+    }
+
+
+def _ngrams(text: str, n: int):
+    """Map each word n-gram to the (start, end) character span of its first occurrence."""
+    words = [(m.group(0).lower(), m.start(), m.end()) for m in WORD_PATTERN.finditer(text)]
+    spans = {}
+    for i in range(len(words) - n + 1):
+        gram = tuple(word for word, _, _ in words[i:i + n])
+        if gram not in spans:
+            spans[gram] = (words[i][1], words[i + n - 1][2])
+    return spans
+
+
+class CitationMatcher:
+    """Attributes streamed answer sentences to the retrieved chunks that support them.
+
+    Chunk n-grams are indexed once per answer, so each completed sentence
+    costs only a set intersection per retrieved chunk.
+    """
+
+    def __init__(self, docs: List[Document], n: int = 3, min_score: float = 0.2):
+        self.docs = docs
+        self.n = n
+        self.min_score = min_score
+        self.chunk_ngrams = [_ngrams(doc.page_content, n) for doc in docs]
+        self.buffer = ""
+        self.offset = 0
+
+    def feed(self, token: str) -> List[dict]:
+        """Add a streamed token and return citations for any sentences it completes."""
+        self.buffer += token
+        citations = []
+        while True:
+            boundary = SENTENCE_END.search(self.buffer)
+            if not boundary:
+                break
+            citations.extend(self._attribute(self.buffer[:boundary.start()], self.offset))
+            self.offset += boundary.end()
+            self.buffer = self.buffer[boundary.end():]
+        return citations
+
+    def flush(self) -> List[dict]:
+        """Attribute whatever remains once the stream has ended."""
+        citations = self._attribute(self.buffer, self.offset)
+        self.offset += len(self.buffer)
+        self.buffer = ""
+        return citations
+
+    def _attribute(self, sentence: str, offset: int) -> List[dict]:
+        sentence_ngrams = set(_ngrams(sentence, self.n))
+        if not sentence_ngrams:
+            return []
+
+        best_index, best_overlap = None, set()
+        for index, chunk_ngrams in enumerate(self.chunk_ngrams):
+            overlap = sentence_ngrams.intersection(chunk_ngrams)
+            if len(overlap) > len(best_overlap):
+                best_index, best_overlap = index, overlap
+
+        score = len(best_overlap) / len(sentence_ngrams)
+        if best_index is None or score < self.min_score:
+            return []
+
+        # Supporting span inside the chunk, from the first to the last matched n-gram
+        spans = [self.chunk_ngrams[best_index][gram] for gram in best_overlap]
+        chunk_start = min(start for start, _ in spans)
+        chunk_end = max(end for _, end in spans)
+        doc = self.docs[best_index]
+
+        leading = len(sentence) - len(sentence.lstrip())
+        return [{
+            "sentence": sentence.strip(),
+            "answer_start": offset + leading,
+            "answer_end": offset + len(sentence.rstrip()),
+            "source_index": best_index,
+            "chunk_id": doc.metadata.get("chunk_id"),
+            "chunk_start": chunk_start,
+            "chunk_end": chunk_end,
+            "score": round(score, 3)
+        }]
+
+
+def cite_answer(answer: str, docs: List[Document]) -> List[dict]:
+    """Attribute every sentence of a complete answer."""
+    matcher = CitationMatcher(docs)
+    return matcher.feed(answer) + matcher.flush()
+
+
+def stream_with_citations(response_stream, docs: List[Document]):
+    """Yield (token, citations) pairs, with the citations of any sentences each token completes.
+
+    A final ("", citations) pair carries the citations for the trailing sentence.
+    """
+    matcher = CitationMatcher(docs)
+    for token in response_stream:
+        yield token, matcher.feed(token)
+    yield "", matcher.flush()
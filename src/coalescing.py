@@ -0,0 +1,168 @@
+import re
+import threading
+from typing import Any, Callable, Iterator
+
+
+def normalize_query(query: str) -> str:
+    """Key identical questions the same way regardless of case, spacing or trailing punctuation."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?.! ").lower()
+
+
+class TokenBroadcast:
+    """Drains one upstream token stream and replays it to any number of subscribers.
+
+    Subscribers that join late first receive every token produced so far.
+    Tokens may be any object, e.g. a token paired with its citations. If the
+    upstream raises, every subscriber re-raises the same error after replay.
+    Once every subscriber has gone away the upstream is closed early.
+    """
+
+    def __init__(self, upstream: Iterator[Any], on_done: Callable[[], None] = None):
+        self.tokens = []
+        self.error = None
+        self.done = False
+        self.subscribers = 0
+        self.cancelled = False
+        self.condition = threading.Condition()
+        self.on_done = on_done
+        self.thread = threading.Thread(target=self._pump, args=(upstream,), daemon=True)
+        self.thread.start()
+
+    def _pump(self, upstream):
+        try:
+            for token in upstream:
+                with self.condition:
+                    if self.cancelled:
+                        break
+                    self.tokens.append(token)
+                    self.condition.notify_all()
+        except Exception as e:
+            with self.condition:
+                self.error = e
+        finally:
+            # Stops the upstream generator, and with it the Groq stream, when cancelled
+            if hasattr(upstream, "close"):
+                upstream.close()
+            # Stop accepting new subscribers before waking the existing ones
+            if self.on_done:
+                self.on_done()
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def subscribe(self):
+        """Return an iterator over the tokens, or None if the stream was already cancelled."""
+        with self.condition:
+            if self.cancelled:
+                return None
+            self.subscribers += 1
+        return _Subscription(self)
+
+    def _unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+            cancel = self.subscribers == 0 and not self.done
+            if cancel:
+                self.cancelled = True
+        if cancel and self.on_done:
+            self.on_done()
+
+
+class _Subscription:
+    """One subscriber's position in a TokenBroadcast.
+
+    Counted from the moment it is created, so a subscriber that has not
+    started reading yet still keeps the upstream alive.
+    """
+
+    def __init__(self, broadcast):
+        self.broadcast = broadcast
+        self.index = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        broadcast = self.broadcast
+        with broadcast.condition:
+            while self.index >= len(broadcast.tokens) and not broadcast.done:
+                broadcast.condition.wait()
+            if self.index < len(broadcast.tokens):
+                token = broadcast.tokens[self.index]
+                self.index += 1
+                return token
+            error = broadcast.error
+        self.close()
+        if error is not None:
+            raise error
+        raise StopIteration
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcast._unsubscribe()
+
+    def __del__(self):
+        self.close()
+
+
+class _Flight:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.result = {}
+        self.broadcast = None
+
+
+class SingleFlight:
+    """Coalesces identical in-flight streaming queries onto one retrieval and one upstream stream.
+
+    `start` must return a dict with a "response_stream"; every other key
+    (such as sources) is shared with all subscribers.
+    """
+
+    def __init__(self, start: Callable[[str], dict]):
+        self.start = start
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def run(self, query: str) -> dict:
+        key = normalize_query(query)
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.flights[key] = flight
+
+        if leader:
+            try:
+                result = self.start(query)
+                flight.result = {name: value for name, value in result.items() if name != "response_stream"}
+                flight.broadcast = TokenBroadcast(
+                    result["response_stream"],
+                    on_done=lambda: self._finish(key, flight)
+                )
+            except Exception:
+                self._finish(key, flight)
+                raise
+            finally:
+                flight.ready.set()
+        else:
+            flight.ready.wait()
+            if flight.broadcast is None:
+                # The leader failed before streaming started; run this query independently
+                return self.start(query)
+
+        subscription = flight.broadcast.subscribe()
+        if subscription is None:
+            # Every earlier subscriber left and the upstream was cancelled; start over
+            return self.start(query)
+        return dict(flight.result, response_stream=subscription)
+
+    def _finish(self, key, flight):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
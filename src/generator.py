@@ -63,9 +63,13 @@ class GroqGenerator(LLM):
                 stream=True  # Enable streaming
             )
             
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            try:
+                for chunk in response:
+                    if chunk.choices[0].delta.content is not None:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Release the HTTP stream if the consumer stops early
+                response.close()
                     
         except Exception as e:
             yield f"Error generating response: {str(e)}"
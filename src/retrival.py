@@ -6,6 +6,10 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from src.generator import GroqGenerator
+from src.coalescing import SingleFlight
+from src.citations import source_from_doc, cite_answer, stream_with_citations
+from src.sharding import load_manifest, ShardCoordinator, ShardedRetriever
+from src.snapshots import IndexManager, SnapshotRetriever
 
 # Load environment variables
 load_dotenv()
@@ -31,21 +35,68 @@ embedding_model = HuggingFaceEmbeddings(model_name="BAAI/bge-large-en-v1.5")
 if not os.path.exists("vectordb"):
     raise FileNotFoundError("Vectorstore not found. Please run 'python create_vectordb.py' to create it first.")
 
-try:
-    vectorstore = FAISS.load_local(
-        "vectordb",
-        embeddings=embedding_model,
-        allow_dangerous_deserialization=True
-    )
-except Exception as e:
-    print(f"Error loading vectorstore: {e}")
+# Shard workers started outside this process, as host:port,host:port,...
+shard_addresses = os.getenv("SHARD_ADDRESSES")
+
+def load_index(index_path: str):
+    """Load one index snapshot and return its retriever with a function that releases it."""
+    shard_timeout = float(os.getenv("SHARD_TIMEOUT", "2.0"))
+    shard_concurrency = int(os.getenv("SHARD_MAX_CONCURRENCY", "8"))
+
+    if shard_addresses:
+        # Externally started shard workers (python -m src.sharding), possibly on other hosts.
+        # They serve whatever shards they were started on, so index_path is not used here.
+        addresses = []
+        for address in shard_addresses.split(","):
+            host, port = address.strip().rsplit(":", 1)
+            addresses.append((host, int(port)))
+        shard_coordinator = ShardCoordinator.connect(
+            addresses,
+            os.getenv("SHARD_AUTHKEY", "").encode(),
+            timeout=shard_timeout,
+            max_concurrency=shard_concurrency
+        )
+        retriever = ShardedRetriever(coordinator=shard_coordinator, embeddings=embedding_model, k=3)
+        return retriever, shard_coordinator.close
+
+    shard_manifest = load_manifest(index_path)
+
+    if shard_manifest:
+        # Sharded index: each shard is searched in its own worker process
+        print(f"Starting {shard_manifest['num_shards']} shard workers...")
+        shard_coordinator = ShardCoordinator.start_local(
+            index_path,
+            timeout=shard_timeout,
+            max_concurrency=shard_concurrency
+        )
+        retriever = ShardedRetriever(coordinator=shard_coordinator, embeddings=embedding_model, k=3)
+        return retriever, shard_coordinator.close
+
     try:
-        vectorstore = FAISS.load_local("vectordb", embedding_model)
-    except Exception as e2:
-        print(f"Fallback also failed: {e2}")
-        raise ValueError("Could not load vectorstore. Please run 'python create_vectordb.py' to recreate it.")
+        vectorstore = FAISS.load_local(
+            index_path,
+            embeddings=embedding_model,
+            allow_dangerous_deserialization=True
+        )
+    except Exception as e:
+        print(f"Error loading vectorstore: {e}")
+        try:
+            vectorstore = FAISS.load_local(index_path, embedding_model)
+        except Exception as e2:
+            print(f"Fallback also failed: {e2}")
+            raise ValueError("Could not load vectorstore. Please run 'python create_vectordb.py' to recreate it.")
+
+    return vectorstore.as_retriever(search_kwargs={"k": 3}), lambda: None
 
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+# Serve the snapshot vectordb/CURRENT points at and hot-swap it when a rebuild publishes a new one
+index_manager = IndexManager(
+    "vectordb",
+    load_index,
+    poll_interval=float(os.getenv("INDEX_POLL_INTERVAL", "5.0")),
+    # External shard workers must be restarted on a new snapshot by whoever runs them
+    watch=not shard_addresses
+)
+retriever = SnapshotRetriever(manager=index_manager)
 
 # Initialize the Groq generator
 llm = GroqGenerator()
@@ -71,18 +122,21 @@ def response_with_sources(user_input: str) -> dict:
     """Run the QA chain and return answer with sources."""
     try:
         result = qa_chain({"query": user_input})
+        docs = result["source_documents"]
         return {
             "answer": result["result"],
-            "sources": [doc.page_content[:200] + "..." for doc in result["source_documents"]]
+            "sources": [source_from_doc(doc) for doc in docs],
+            "citations": cite_answer(result["result"], docs)
         }
     except Exception as e:
         return {
             "answer": f"Error processing query: {str(e)}",
-            "sources": []
+            "sources": [],
+            "citations": []
         }
 
-def response_with_sources_streaming(user_input: str):
-    """Run the QA chain and return streaming answer with sources."""
+def _start_streaming(user_input: str):
+    """Retrieve context and open one Groq stream for a query."""
     try:
         # Get relevant documents first
         docs = retriever.invoke(user_input)
@@ -97,10 +151,10 @@ def response_with_sources_streaming(user_input: str):
         llm_instance = GroqGenerator()
         
         # Return sources immediately
-        sources = [doc.page_content[:200] + "..." for doc in docs]
+        sources = [source_from_doc(doc) for doc in docs]
         
-        # Stream the response
-        response_stream = llm_instance.stream_call(prompt)
+        # Stream the response, attributing sentences once for every subscriber
+        response_stream = stream_with_citations(llm_instance.stream_call(prompt), docs)
         
         return {
             "response_stream": response_stream,
@@ -112,6 +166,37 @@ def response_with_sources_streaming(user_input: str):
             yield f"Error processing query: {str(e)}"
         
         return {
-            "response_stream": error_stream(),
+            "response_stream": stream_with_citations(error_stream(), []),
             "sources": []
         }
+
+# Identical questions asked while one is in flight share its retrieval and Groq stream
+streaming_flights = SingleFlight(_start_streaming)
+
+def response_with_sources_streaming(user_input: str):
+    """Run the QA chain and return streaming answer with sources.
+
+    "citations" fills in as the stream is consumed, one entry per answer
+    sentence attributed to a retrieved chunk.
+    """
+    result = streaming_flights.run(user_input)
+    citations = []
+    
+    def response_stream():
+        try:
+            for token, new_citations in result["response_stream"]:
+                citations.extend(new_citations)
+                if token:
+                    yield token
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+        finally:
+            # Leave the shared stream so it can stop once nobody is listening
+            if hasattr(result["response_stream"], "close"):
+                result["response_stream"].close()
+    
+    return {
+        "response_stream": response_stream(),
+        "sources": list(result["sources"]),
+        "citations": citations
+    }
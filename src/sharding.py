@@ -0,0 +1,432 @@
+import os
+import sys
+import json
+import time
+import heapq
+import atexit
+import pickle
+import socket
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import answer_challenge, deliver_challenge
+from typing import Any, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.documents import Document
+
+MANIFEST_NAME = "shards.json"
+# Time a client gets to complete the authkey handshake with a shard worker
+HANDSHAKE_TIMEOUT = 10.0
+
+
+class QueryVectorEmbeddings(Embeddings):
+    """Placeholder embeddings for shard workers.
+
+    The coordinator embeds each query once and sends the vector, so workers
+    never need to load the embedding model themselves.
+    """
+
+    def embed_documents(self, texts):
+        raise NotImplementedError("Shard workers only search by vector")
+
+    def embed_query(self, text):
+        raise NotImplementedError("Shard workers only search by vector")
+
+
+def load_manifest(vectordb_path: str) -> Optional[dict]:
+    """Return the shard manifest for a vectordb directory, or None if unsharded."""
+    manifest_path = os.path.join(vectordb_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(vectordb_path: str, shard_dirs: List[str]):
+    manifest = {"num_shards": len(shard_dirs), "shards": shard_dirs}
+    with open(os.path.join(vectordb_path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class _ShardConnection:
+    """A multiprocessing.connection-framed socket whose calls share one deadline.
+
+    `multiprocessing.connection` has no timeouts for the TCP connect or the
+    authkey handshake, so a peer that connects and then stalls would block
+    the thread serving it forever. This speaks the same framing over a plain
+    socket whose timeout shrinks towards the current deadline.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.deadline = None
+
+    @classmethod
+    def open(cls, address, authkey: bytes, timeout: float):
+        """Connect and authenticate to a shard worker within `timeout`."""
+        conn = cls(socket.create_connection(tuple(address), timeout=timeout))
+        conn.set_deadline(timeout)
+        try:
+            answer_challenge(conn, authkey)
+            deliver_challenge(conn, authkey)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def set_deadline(self, timeout: Optional[float]):
+        """Bound every following step by `timeout` seconds from now, or not at all if None."""
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+
+    def _arm(self):
+        if self.deadline is None:
+            self.sock.settimeout(None)
+            return
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("Shard call exceeded its deadline")
+        self.sock.settimeout(remaining)
+
+    def _recv_exact(self, size):
+        buf = bytearray()
+        while len(buf) < size:
+            self._arm()
+            chunk = self.sock.recv(size - len(buf))
+            if not chunk:
+                raise EOFError("Connection closed by peer")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def send_bytes(self, buf):
+        n = len(buf)
+        if n > 0x7fffffff:
+            header = struct.pack("!i", -1) + struct.pack("!Q", n)
+        else:
+            header = struct.pack("!i", n)
+        self._arm()
+        self.sock.sendall(header + buf)
+
+    def recv_bytes(self, maxlength=None):
+        size, = struct.unpack("!i", self._recv_exact(4))
+        if size == -1:
+            size, = struct.unpack("!Q", self._recv_exact(8))
+        if maxlength is not None and size > maxlength:
+            raise OSError("bad message length")
+        return self._recv_exact(size)
+
+    def send(self, obj):
+        self.send_bytes(pickle.dumps(obj))
+
+    def recv(self):
+        return pickle.loads(self.recv_bytes())
+
+    def close(self):
+        self.sock.close()
+
+
+def _handle_connection(sock, authkey, vectorstore, shard_path):
+    conn = _ShardConnection(sock)
+    try:
+        # Authenticate on this connection's own thread so a slow or silent
+        # client can never hold up the accept loop
+        conn.set_deadline(HANDSHAKE_TIMEOUT)
+        deliver_challenge(conn, authkey)
+        answer_challenge(conn, authkey)
+
+        # Coordinators keep authenticated connections open between queries
+        conn.set_deadline(None)
+        while True:
+            try:
+                embedding, k = conn.recv()
+            except EOFError:
+                break
+            results = vectorstore.similarity_search_with_score_by_vector(embedding, k=k)
+            conn.send([(doc.page_content, doc.metadata, float(score)) for doc, score in results])
+    except (AuthenticationError, EOFError, OSError) as e:
+        print(f"Shard {shard_path} dropped a connection: {e}")
+    finally:
+        conn.close()
+
+
+def serve_shard(shard_path: str, address, authkey: bytes, ready_queue=None):
+    """Load one FAISS shard and answer vector searches over a local connection."""
+    from langchain_community.vectorstores import FAISS
+
+    try:
+        vectorstore = FAISS.load_local(
+            shard_path,
+            embeddings=QueryVectorEmbeddings(),
+            allow_dangerous_deserialization=True
+        )
+        server = socket.create_server(tuple(address), backlog=128)
+    except Exception as e:
+        if ready_queue is not None:
+            ready_queue.put((shard_path, None, str(e)))
+        raise
+
+    address = server.getsockname()[:2]
+    if ready_queue is not None:
+        ready_queue.put((shard_path, address, None))
+    print(f"Shard {shard_path} listening on {address}")
+
+    while True:
+        try:
+            sock, _ = server.accept()
+        except OSError as e:
+            print(f"Shard {shard_path} failed to accept a connection: {e}")
+            continue
+        threading.Thread(
+            target=_handle_connection,
+            args=(sock, authkey, vectorstore, shard_path),
+            daemon=True
+        ).start()
+
+
+def _spawn_workers(shard_paths, authkey: bytes, startup_timeout: float):
+    """Start one worker process per shard and wait until each is listening.
+
+    Raises if any shard fails to load or start in time, after stopping the
+    workers that did start.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    ready_queue = ctx.Queue()
+    processes = []
+    for shard_path in shard_paths:
+        process = ctx.Process(
+            target=serve_shard,
+            args=(shard_path, ("127.0.0.1", 0), authkey, ready_queue),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    started, failed = {}, []
+    pending = set(shard_paths)
+    for _ in processes:
+        try:
+            shard_path, address, error = ready_queue.get(timeout=startup_timeout)
+        except Exception:
+            break
+        pending.discard(shard_path)
+        if error:
+            failed.append(f"{shard_path} ({error})")
+        else:
+            started[shard_path] = address
+    failed.extend(f"{shard_path} (timed out starting)" for shard_path in sorted(pending))
+
+    if failed:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        raise ValueError(f"Shard workers failed to start: {', '.join(failed)}")
+
+    return processes, [started[shard_path] for shard_path in shard_paths]
+
+
+class ShardCoordinator:
+    """Fans a query vector out to shard workers and merges their top-k.
+
+    Every shard call is bounded by `timeout`. Authenticated connections are
+    pooled per shard and reused across queries. Shards that error or miss
+    the timeout are skipped, so a query returns partial results instead of
+    failing outright.
+
+    Locally spawned workers are supervised: a worker that dies is restarted,
+    and if it cannot be restarted, searches raise instead of silently
+    serving part of the corpus.
+    """
+
+    def __init__(self, addresses, authkey: bytes, timeout: float = 2.0, max_concurrency: int = 8):
+        self.addresses = [tuple(address) for address in addresses]
+        self.authkey = authkey
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.processes = []
+        self.shard_paths = []
+        self.down = {}
+        self.closed = False
+        # One thread per shard for each query that may be in flight at once
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.addresses) * max_concurrency))
+
+    @classmethod
+    def connect(cls, addresses, authkey: bytes, timeout: float = 2.0, max_concurrency: int = 8):
+        """Attach to shard workers that were started separately.
+
+        Raises if any of them cannot be reached, rather than silently serving
+        part of the corpus.
+        """
+        coordinator = cls(addresses, authkey, timeout=timeout, max_concurrency=max_concurrency)
+        unreachable = []
+        for address in coordinator.addresses:
+            try:
+                coordinator._checkin(address, _ShardConnection.open(address, authkey, timeout))
+            except Exception as e:
+                unreachable.append(f"{address[0]}:{address[1]} ({e})")
+        if unreachable:
+            coordinator.close()
+            raise ValueError(f"Could not reach shard workers: {', '.join(unreachable)}")
+        return coordinator
+
+    @classmethod
+    def start_local(cls, vectordb_path: str, timeout: float = 2.0, max_concurrency: int = 8,
+                    startup_timeout: float = 300.0):
+        """Spawn one worker process per shard listed in the manifest.
+
+        Raises if any shard fails to load, rather than silently serving part
+        of the corpus.
+        """
+        manifest = load_manifest(vectordb_path)
+        if manifest is None:
+            raise FileNotFoundError(f"No {MANIFEST_NAME} found in {vectordb_path}")
+
+        shard_paths = [os.path.join(vectordb_path, shard_dir) for shard_dir in manifest["shards"]]
+        authkey = os.urandom(16)
+        processes, addresses = _spawn_workers(shard_paths, authkey, startup_timeout)
+
+        coordinator = cls(addresses, authkey, timeout=timeout, max_concurrency=max_concurrency)
+        coordinator.processes = processes
+        coordinator.shard_paths = shard_paths
+        coordinator.startup_timeout = startup_timeout
+        threading.Thread(target=coordinator._supervise, daemon=True).start()
+        atexit.register(coordinator.close)
+        return coordinator
+
+    def _supervise(self):
+        """Restart local workers that have exited."""
+        while not self.closed:
+            time.sleep(1.0)
+            for index, process in enumerate(list(self.processes)):
+                if self.closed or process.is_alive():
+                    continue
+                shard_path = self.shard_paths[index]
+                print(f"Shard worker {shard_path} exited with code {process.exitcode}, restarting...")
+                try:
+                    processes, addresses = _spawn_workers([shard_path], self.authkey, self.startup_timeout)
+                except Exception as e:
+                    with self.lock:
+                        self.down[index] = str(e)
+                    print(f"Could not restart shard worker {shard_path}: {e}")
+                    continue
+                with self.lock:
+                    if self.closed:
+                        processes[0].terminate()
+                        return
+                    stale = self.idle.pop(self.addresses[index], [])
+                    self.processes[index] = processes[0]
+                    self.addresses[index] = addresses[0]
+                    self.down.pop(index, None)
+                for conn in stale:
+                    conn.close()
+
+    def _checkout(self, address):
+        """Return (connection, reused) with its deadline set for one call."""
+        with self.lock:
+            pool = self.idle.get(address)
+            conn = pool.pop() if pool else None
+        if conn is None:
+            return _ShardConnection.open(address, self.authkey, self.timeout), False
+        conn.set_deadline(self.timeout)
+        return conn, True
+
+    def _checkin(self, address, conn):
+        with self.lock:
+            pool = self.idle.setdefault(address, [])
+            if not self.closed and len(pool) < self.max_concurrency:
+                pool.append(conn)
+                return
+        conn.close()
+
+    def _search_shard(self, address, embedding, k):
+        # The deadline starts when the call runs, not when it was queued
+        conn, reused = self._checkout(address)
+        try:
+            conn.send((embedding, k))
+            results = conn.recv()
+        except (EOFError, ConnectionError):
+            conn.close()
+            if not reused:
+                raise
+            # A pooled connection can go stale if the worker restarted; retry once on a fresh one
+            conn = _ShardConnection.open(address, self.authkey, self.timeout)
+            try:
+                conn.send((embedding, k))
+                results = conn.recv()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            # A timed-out or failed connection may have a reply in flight, so never reuse it
+            conn.close()
+            raise
+        self._checkin(address, conn)
+        return results
+
+    def search(self, embedding: List[float], k: int = 3):
+        """Return the merged top-k (Document, score) pairs across all shards."""
+        with self.lock:
+            if self.down:
+                down = ", ".join(f"{self.shard_paths[index]} ({error})" for index, error in self.down.items())
+                raise ValueError(f"Shard workers are down: {down}")
+            addresses = list(self.addresses)
+
+        futures = {
+            self.executor.submit(self._search_shard, address, embedding, k): address
+            for address in addresses
+        }
+        # Each call gives up on its own after `timeout`, so this always returns
+        wait(futures)
+
+        results = []
+        for future, address in futures.items():
+            try:
+                results.extend(future.result())
+            except socket.timeout:
+                print(f"Shard at {address} timed out, returning partial results")
+            except Exception as e:
+                print(f"Shard at {address} failed: {e}")
+
+        # FAISS scores are L2 distances, so the closest chunks have the lowest score
+        top = heapq.nsmallest(k, results, key=lambda result: result[2])
+        return [(Document(page_content=text, metadata=metadata), score) for text, metadata, score in top]
+
+    def close(self):
+        # Hot swaps close retired coordinators, so drop their exit hook too
+        atexit.unregister(self.close)
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, {}
+        for pool in idle.values():
+            for conn in pool:
+                conn.close()
+        self.executor.shutdown(wait=False)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+
+class ShardedRetriever(BaseRetriever):
+    """LangChain retriever backed by a ShardCoordinator."""
+
+    coordinator: Any
+    embeddings: Any
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
+        embedding = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.coordinator.search(embedding, k=self.k)]
+
+
+if __name__ == "__main__":
+    # Run a standalone shard worker: python -m src.sharding <shard_path> <host> <port>
+    # and point the app at it with SHARD_ADDRESSES=host:port,... and the same SHARD_AUTHKEY
+    shard_path, host, port = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    authkey = os.getenv("SHARD_AUTHKEY", "").encode()
+    if not authkey:
+        raise ValueError("SHARD_AUTHKEY environment variable must be set for standalone shard workers.")
+    serve_shard(shard_path, (host, port), authkey)
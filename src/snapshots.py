@@ -0,0 +1,163 @@
+import os
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.documents import Document
+
+SNAPSHOTS_DIR = "snapshots"
+POINTER_NAME = "CURRENT"
+
+
+def new_snapshot_path(vectordb_path: str) -> str:
+    """Create an empty, uniquely named snapshot directory to build an index into."""
+    snapshots_path = os.path.join(vectordb_path, SNAPSHOTS_DIR)
+    os.makedirs(snapshots_path, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S")
+    path, suffix = os.path.join(snapshots_path, version), 1
+    while os.path.exists(path):
+        path = os.path.join(snapshots_path, f"{version}-{suffix}")
+        suffix += 1
+    os.makedirs(path)
+    return path
+
+
+def publish_snapshot(vectordb_path: str, snapshot_path: str):
+    """Atomically point CURRENT at a fully written snapshot."""
+    pointer_path = os.path.join(vectordb_path, POINTER_NAME)
+    tmp_path = pointer_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(snapshot_path))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer_path)
+
+
+def prune_snapshots(vectordb_path: str, keep: int = 3):
+    """Delete all but the newest `keep` snapshots, never the current one."""
+    snapshots_path = os.path.join(vectordb_path, SNAPSHOTS_DIR)
+    if not os.path.isdir(snapshots_path):
+        return
+    current = current_version(vectordb_path)
+    versions = sorted(os.listdir(snapshots_path), key=lambda v: os.path.getmtime(os.path.join(snapshots_path, v)))
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(snapshots_path, version), ignore_errors=True)
+
+
+def current_version(vectordb_path: str):
+    """Return the snapshot CURRENT points at, or None for a legacy in-place index."""
+    pointer_path = os.path.join(vectordb_path, POINTER_NAME)
+    if not os.path.exists(pointer_path):
+        return None
+    with open(pointer_path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def snapshot_path(vectordb_path: str, version) -> str:
+    if version is None:
+        return vectordb_path
+    return os.path.join(vectordb_path, SNAPSHOTS_DIR, version)
+
+
+class _LoadedIndex:
+    def __init__(self, version, retriever, close):
+        self.version = version
+        self.retriever = retriever
+        self.close = close
+        self.refs = 0
+        self.retired = False
+
+
+class IndexManager:
+    """Holds the live index and hot-swaps it when CURRENT changes.
+
+    Queries lease the index through `acquire()`. A superseded index is
+    released once its last lease ends, and no newer snapshot is loaded while
+    it is still held, so at most two indexes are ever in memory at once.
+    """
+
+    def __init__(self, vectordb_path: str, load: Callable[[str], tuple], poll_interval: float = 5.0,
+                 watch: bool = True):
+        self.vectordb_path = vectordb_path
+        self.load = load
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+
+        version = current_version(vectordb_path)
+        retriever, close = load(snapshot_path(vectordb_path, version))
+        self.current = _LoadedIndex(version, retriever, close)
+        self.retiring = None
+        self.failed_version = None
+
+        self.watcher = None
+        if watch:
+            self.watcher = threading.Thread(target=self._watch, daemon=True)
+            self.watcher.start()
+
+    @contextmanager
+    def acquire(self):
+        with self.lock:
+            index = self.current
+            index.refs += 1
+        try:
+            yield index.retriever
+        finally:
+            with self.lock:
+                index.refs -= 1
+                release = index.retired and index.refs == 0
+            if release:
+                self._release(index)
+
+    def _release(self, index):
+        index.close()
+        # Drop the last reference so the old index's memory is freed now
+        index.retriever = None
+        with self.lock:
+            if self.retiring is index:
+                self.retiring = None
+                self.released.notify_all()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            version = None
+            try:
+                version = current_version(self.vectordb_path)
+                if version is None or version in (self.current.version, self.failed_version):
+                    continue
+
+                # Bound memory: wait until the previous swap's old index is gone
+                with self.lock:
+                    while self.retiring is not None:
+                        self.released.wait()
+
+                print(f"Loading index snapshot {version}...")
+                retriever, close = self.load(snapshot_path(self.vectordb_path, version))
+                self.swap(_LoadedIndex(version, retriever, close))
+                print(f"Switched to index snapshot {version}")
+            except Exception as e:
+                self.failed_version = version
+                print(f"Error loading index snapshot {version}: {e}")
+
+    def swap(self, index):
+        with self.lock:
+            old, self.current = self.current, index
+            old.retired = True
+            self.retiring = old
+            release = old.refs == 0
+        if release:
+            self._release(old)
+
+
+class SnapshotRetriever(BaseRetriever):
+    """LangChain retriever that always searches the manager's live index."""
+
+    manager: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
+        with self.manager.acquire() as retriever:
+            return retriever.invoke(query)